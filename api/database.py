@@ -1,14 +1,97 @@
 import os
+import asyncio
+import pymongo
+from pymongo import ReadPreference
 from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import load_dotenv
+from api.profiling import command_listeners
 
 load_dotenv()
 
 MONGO_URI = os.getenv("MONGO_URI")
+MONGO_DB = os.getenv("MONGO_DB", "chat_app")
 
-client = AsyncIOMotorClient(MONGO_URI)
-db = client.chat_app
+# Pool / timeout tuning; values are passed straight to the driver
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 100))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 5))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 60000))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 5000))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", 20000))
+# e.g. "secondaryPreferred" to serve message history from replicas (may lag the primary slightly)
+MONGO_READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "primary")
+MONGO_HISTORY_READ_PREFERENCE = os.getenv("MONGO_HISTORY_READ_PREFERENCE", MONGO_READ_PREFERENCE)
+# Spilled offline-outbox references expire after this long; history endpoints still have the messages
+OUTBOX_TTL_DAYS = int(os.getenv("OUTBOX_TTL_DAYS", 14))
+
+def read_preference(mode: str):
+    """Maps a URI-style mode name ("secondaryPreferred") to a pymongo read preference."""
+    name = "".join("_" + c if c.isupper() else c for c in mode).upper()
+    try:
+        return getattr(ReadPreference, name)
+    except AttributeError:
+        raise ValueError(f"Unknown read preference: {mode}")
+
+client = AsyncIOMotorClient(
+    MONGO_URI,
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+    connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+    event_listeners=command_listeners(),
+)
+db = client.get_database(MONGO_DB, read_preference=read_preference(MONGO_READ_PREFERENCE))
+# Message history reads; everything else (and all writes) goes through `db`
+history_db = client.get_database(MONGO_DB, read_preference=read_preference(MONGO_HISTORY_READ_PREFERENCE))
 
 # Optional: Helper to check connection
 async def get_db():
-    return db
\ No newline at end of file
+    return db
+
+def search_fields(name: str, email: str) -> dict:
+    """Lower-cased copies of name/email; anchored regexes on these can use an index."""
+    return {"name_lower": name.lower(), "email_lower": email.lower()}
+
+async def backfill_search_fields():
+    await db.users.update_many(
+        {"name_lower": {"$exists": False}},
+        [{"$set": {"name_lower": {"$toLower": "$name"}, "email_lower": {"$toLower": "$email"}}}]
+    )
+
+async def ensure_indexes():
+    """Indexes backing the hot lookups (history, last message, unread counts, ETag versions, directory)."""
+    await backfill_search_fields()
+    await asyncio.gather(
+        db.messages.create_index([("sender_id", pymongo.ASCENDING), ("recipient_id", pymongo.ASCENDING), ("timestamp", pymongo.DESCENDING)]),
+        db.messages.create_index([("recipient_id", pymongo.ASCENDING), ("is_group", pymongo.ASCENDING), ("timestamp", pymongo.DESCENDING)]),
+        db.messages.create_index([("sender_id", pymongo.ASCENDING), ("timestamp", pymongo.DESCENDING)]),
+        # Cover the conversation-partner distinct() calls so they never touch documents
+        db.messages.create_index([("sender_id", pymongo.ASCENDING), ("is_group", pymongo.ASCENDING), ("recipient_id", pymongo.ASCENDING)]),
+        db.messages.create_index([("recipient_id", pymongo.ASCENDING), ("is_group", pymongo.ASCENDING), ("sender_id", pymongo.ASCENDING)]),
+        db.conversation_status.create_index([("user_id", pymongo.ASCENDING), ("conversation_id", pymongo.ASCENDING)]),
+        db.conversation_status.create_index([("user_id", pymongo.ASCENDING), ("last_read_at", pymongo.DESCENDING)]),
+        db.users.create_index("email"),
+        db.users.create_index([("last_seen", pymongo.DESCENDING)]),
+        db.users.create_index([("name_lower", pymongo.ASCENDING), ("_id", pymongo.ASCENDING)]),
+        db.users.create_index([("email_lower", pymongo.ASCENDING), ("_id", pymongo.ASCENDING)]),
+        db.groups.create_index("members"),
+        db.outbox.create_index([("user_id", pymongo.ASCENDING), ("_id", pymongo.ASCENDING)]),
+        db.outbox.create_index("created_at", expireAfterSeconds=OUTBOX_TTL_DAYS * 24 * 3600),
+    )
+
+async def ping(timeout_ms: int = 1000) -> bool:
+    try:
+        await asyncio.wait_for(client.admin.command("ping"), timeout_ms / 1000)
+        return True
+    except Exception:
+        return False
+
+async def warm_up():
+    """Run before accepting traffic: verify connectivity, build indexes, open the minimum pool."""
+    await client.admin.command("ping")
+    await ensure_indexes()
+    # Concurrent pings check out up to minPoolSize sockets now rather than on the first burst
+    # of requests; they touch no collection, so they cost nothing on the server
+    await asyncio.gather(*(client.admin.command("ping") for _ in range(max(MONGO_MIN_POOL_SIZE, 1))))
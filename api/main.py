@@ -1,13 +1,23 @@
-from fastapi import FastAPI, HTTPException, Depends, status, WebSocket, WebSocketDisconnect, Query
+from fastapi import FastAPI, HTTPException, Depends, status, WebSocket, WebSocketDisconnect, Query, Request, Response, Header
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from typing import Annotated, List
+from fastapi.responses import PlainTextResponse
+from typing import Annotated, Dict, List, Literal, Optional, Tuple
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorDatabase
 import pymongo
+import os
+import re
+import signal
+import asyncio
+import threading
+import time
+import json
+import base64
 
-from api.models import UserModel, UserResponse, Token, TokenData, MessageModel, GroupModel, AddMembersRequest, ConversationStatus
-from api.database import get_db, db
+from api.models import UserModel, UserResponse, Token, TokenData, MessageModel, GroupModel, AddMembersRequest, ConversationStatus, DirectoryPage
+from api.database import get_db, db, history_db, warm_up, ping, search_fields
 from api.auth import (
     get_password_hash,
     verify_password,
@@ -18,8 +28,83 @@ from api.auth import (
 )
 from jose import JWTError, jwt
 from api.sockets import manager
+from api.outbox import outbox
+from api.ratelimit import limiter
+from api.profiling import TimingMiddleware, ws_timer, profile_event_loop, profiler_authorized, PROFILE_REQUESTS, ENABLE_PROFILER
+from api.etag import make_etag, not_modified, stamp
+from api.read_markers import read_markers
+from api.serialization import fast_json, projection, USER_FIELDS, GROUP_FIELDS, MESSAGE_FIELDS
 
-app = FastAPI()
+# Time between failing /ready and closing WebSockets, so load balancers stop routing here first
+DRAIN_GRACE_SECONDS = float(os.getenv("DRAIN_GRACE_SECONDS", 5))
+
+async def begin_drain():
+    """Fails readiness, turns new /ws connections away, then closes open WebSockets.
+
+    Runs while the server is still listening and the sockets are still open: uvicorn itself
+    closes every connection and waits out its graceful timeout *before* lifespan shutdown.
+    """
+    if manager.draining:
+        return
+    app.state.ready = False
+    manager.draining = True
+    await asyncio.sleep(DRAIN_GRACE_SECONDS)
+    await manager.drain()
+
+def install_drain_handlers() -> dict:
+    """Chains SIGTERM/SIGINT so `begin_drain` runs before the server's own shutdown.
+
+    Returns the previous handlers so they can be restored. A second signal while draining is
+    forwarded immediately (forced exit).
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return {}
+    loop = asyncio.get_running_loop()
+    previous = {sig: signal.getsignal(sig) for sig in (signal.SIGTERM, signal.SIGINT)}
+    draining_tasks = set()
+
+    def forward(sig, frame):
+        handler = previous[sig]
+        if callable(handler):
+            handler(sig, frame)
+        else:
+            signal.signal(sig, handler)
+            signal.raise_signal(sig)
+
+    def start_drain(sig, frame):
+        task = loop.create_task(begin_drain())
+        draining_tasks.add(task)
+        task.add_done_callback(draining_tasks.discard)
+        task.add_done_callback(lambda _: forward(sig, frame))
+
+    def on_signal(sig, frame):
+        if manager.draining:
+            forward(sig, frame)
+        else:
+            loop.call_soon_threadsafe(start_drain, sig, frame)
+
+    for sig in previous:
+        signal.signal(sig, on_signal)
+    return previous
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.ready = False
+    await warm_up()
+    read_markers.on_flush = manager.send_read_receipt
+    read_markers.start()
+    previous_handlers = install_drain_handlers()
+    app.state.ready = True
+    yield
+    for sig, handler in previous_handlers.items():
+        signal.signal(sig, handler)
+    # Normally already done by the signal hook; covers servers that skip it
+    app.state.ready = False
+    await manager.drain()
+    await outbox.stop()
+    await read_markers.stop()
+
+app = FastAPI(lifespan=lifespan)
 
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -31,6 +116,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if PROFILE_REQUESTS:
+    app.add_middleware(TimingMiddleware)
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
@@ -65,37 +153,73 @@ async def get_user_from_token(token: str):
         return None
 
 @app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket, token: str = Query(...)):
+async def websocket_endpoint(websocket: WebSocket, token: str = Query(...), batch: bool = Query(False)):
     user_id = await get_user_from_token(token)
     if not user_id:
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         return
 
+    if manager.draining:
+        await websocket.close(code=1012)
+        return
+
+    if batch:
+        # Client understands array frames; coalesce its outbound frames per tick/window
+        manager.enable_batching(websocket)
     await manager.connect(websocket, user_id)
     try:
         while True:
             data = await websocket.receive_json()
             message_type = data.get("type", "message")
-            
-            if message_type == "typing":
-                recipient_id = data.get("recipient_id")
-                is_group = data.get("is_group", False)
-                if recipient_id:
-                     await manager.broadcast_typing(user_id, recipient_id, is_group)
-            
-            elif message_type == "message":
-                recipient_id = data.get("recipient_id")
-                content = data.get("content")
-                is_group = data.get("is_group", False)
-
-                if recipient_id and content:
-                    if is_group:
-                        await manager.send_group_message(content, user_id, recipient_id)
-                    else:
-                        await manager.send_personal_message(content, user_id, recipient_id)
+
+            # Per-user / per-connection budgets, then the global in-flight cap
+            rejected = limiter.check(user_id, websocket, message_type) or limiter.try_admit(message_type)
+            if rejected:
+                # Through the manager so a reject never overtakes frames queued for this connection
+                await manager.send(websocket, rejected)
+                continue
+
+            try:
+                with ws_timer(message_type):
+                    await handle_ws_event(user_id, message_type, data)
+            finally:
+                limiter.release()
     except WebSocketDisconnect:
+        limiter.forget_connection(websocket)
+        limiter.forget_user(user_id)
         await manager.disconnect(websocket, user_id)
 
+async def handle_ws_event(user_id: str, message_type: str, data: dict):
+    if message_type == "typing":
+        recipient_id = data.get("recipient_id")
+        is_group = data.get("is_group", False)
+        if recipient_id:
+             await manager.broadcast_typing(user_id, recipient_id, is_group)
+
+    elif message_type == "message":
+        recipient_id = data.get("recipient_id")
+        content = data.get("content")
+        is_group = data.get("is_group", False)
+
+        if recipient_id and content:
+            if is_group:
+                await manager.send_group_message(content, user_id, recipient_id)
+            else:
+                await manager.send_personal_message(content, user_id, recipient_id)
+
+@app.get("/metrics")
+async def metrics():
+    """Process-local counters: WebSocket admission (in-flight sends, throttled events by kind/reason)."""
+    return {"ws": limiter.stats()}
+
+@app.get("/ready")
+async def readiness():
+    if not getattr(app.state, "ready", False) or manager.draining:
+        raise HTTPException(status_code=503, detail="Not ready")
+    if not await ping():
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    return {"status": "ready"}
+
 @app.post("/register", response_model=UserResponse)
 async def register(user: UserModel):
     # Check if existing
@@ -108,6 +232,7 @@ async def register(user: UserModel):
     
     user_dict = user.model_dump(exclude={"id"})
     user_dict["password"] = get_password_hash(user_dict["password"])
+    user_dict.update(search_fields(user_dict["name"], user_dict["email"]))
     
     new_user = await db.users.insert_one(user_dict)
     created_user = await db.users.find_one({"_id": new_user.inserted_id})
@@ -133,20 +258,118 @@ async def login_for_access_token(form_data: Annotated[OAuth2PasswordRequestForm,
 async def read_users_me(current_user: Annotated[dict, Depends(get_current_user)]):
     return current_user
 
+def encode_cursor(user: dict) -> str:
+    raw = json.dumps([user.get("name_lower", ""), str(user["_id"])])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        name_lower, user_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return name_lower, ObjectId(user_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def conversation_partner_ids(user_id: str) -> List[ObjectId]:
+    """Users the caller has exchanged direct messages with (two index-backed distinct calls)."""
+    sent_to = await db.messages.distinct("recipient_id", {"sender_id": user_id, "is_group": False})
+    received_from = await db.messages.distinct("sender_id", {"recipient_id": user_id, "is_group": False})
+    return [ObjectId(uid) for uid in set(sent_to) | set(received_from) if uid != user_id and ObjectId.is_valid(uid)]
+
+@app.get("/users/directory", response_model=DirectoryPage)
+async def user_directory(
+    current_user: Annotated[dict, Depends(get_current_user)],
+    q: Optional[str] = Query(None, max_length=100),
+    scope: Literal["conversations", "all"] = "conversations",
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+):
+    """Case-insensitive prefix search on name/email with keyset pagination on (name_lower, _id).
+
+    Defaults to the caller's conversation partners; `scope=all` searches everyone.
+    """
+    clauses = []
+    if scope == "conversations":
+        clauses.append({"_id": {"$in": await conversation_partner_ids(str(current_user["_id"]))}})
+    else:
+        clauses.append({"_id": {"$ne": current_user["_id"]}})
+
+    prefix = (q or "").strip().lower()
+    if prefix:
+        # Anchored, case-sensitive regexes on the lower-cased fields are index range scans
+        pattern = "^" + re.escape(prefix)
+        clauses.append({"$or": [{"name_lower": {"$regex": pattern}}, {"email_lower": {"$regex": pattern}}]})
+
+    if cursor:
+        name_lower, last_id = decode_cursor(cursor)
+        clauses.append({"$or": [
+            {"name_lower": {"$gt": name_lower}},
+            {"name_lower": name_lower, "_id": {"$gt": last_id}},
+        ]})
+
+    users = await db.users.find(
+        {"$and": clauses},
+        projection={"name": 1, "email": 1, "last_seen": 1, "name_lower": 1}
+    ).sort([("name_lower", pymongo.ASCENDING), ("_id", pymongo.ASCENDING)]).limit(limit + 1).to_list(length=limit + 1)
+
+    next_cursor = encode_cursor(users[limit - 1]) if len(users) > limit else None
+    return {"users": users[:limit], "next_cursor": next_cursor}
+
 @app.get("/users/{user_id}", response_model=UserResponse)
-async def get_user_data(user_id: str):
+async def get_user_data(user_id: str, request: Request, response: Response):
     if not ObjectId.is_valid(user_id):
         raise HTTPException(status_code=400, detail="Invalid user ID format")
         
-    user = await db.users.find_one({"_id": ObjectId(user_id)})
+    user = await db.users.find_one(
+        {"_id": ObjectId(user_id)},
+        projection={"name": 1, "email": 1, "last_seen": 1}
+    )
     if user:
-        return user
+        etag = make_etag(user["_id"], user.get("name"), user.get("email"), user.get("last_seen"))
+        return not_modified(request, response, etag) or user
     raise HTTPException(status_code=404, detail="User not found")
 
+async def users_version(user_id: str, partner_ids: List[ObjectId]):
+    """Cheap version of the /users view: newest DM touching the user, newest read marker,
+    activity of the listed users (partners, plus a size/newest-signup marker for the fill-up set)."""
+    latest_msg = await db.messages.find_one(
+        {"is_group": False, "$or": [{"sender_id": user_id}, {"recipient_id": user_id}]},
+        projection={"timestamp": 1},
+        sort=[("timestamp", pymongo.DESCENDING)]
+    )
+    latest_read = await db.conversation_status.find_one(
+        {"user_id": user_id},
+        projection={"last_read_at": 1},
+        sort=[("last_read_at", pymongo.DESCENDING)]
+    )
+    # Only the caller's partners: a disconnect elsewhere must not invalidate everyone's tag
+    latest_seen = await db.users.find_one(
+        {"_id": {"$in": partner_ids}}, projection={"last_seen": 1}, sort=[("last_seen", pymongo.DESCENDING)]
+    ) if partner_ids else None
+    newest_user = await db.users.find_one({}, projection={"_id": 1}, sort=[("_id", pymongo.DESCENDING)])
+    user_count = await db.users.estimated_document_count()
+    return make_etag(
+        "users", user_id, stamp(latest_msg), stamp(latest_read, "last_read_at"),
+        read_markers.user_latest.get(user_id), stamp(latest_seen, "last_seen"),
+        newest_user and newest_user["_id"], user_count
+    )
+
 @app.get("/users", response_model=List[UserResponse])
-async def list_users(current_user: Annotated[dict, Depends(get_current_user)]):
+async def list_users(
+    current_user: Annotated[dict, Depends(get_current_user)],
+    request: Request,
+    response: Response,
+):
     current_uid = str(current_user["_id"])
-    users = await db.users.find().to_list(length=100)
+    partner_ids = await conversation_partner_ids(current_uid)
+    cached = not_modified(request, response, await users_version(current_uid, partner_ids))
+    if cached:
+        return cached
+
+    # Conversation partners first so they are never cut off, then fill up with other users
+    fields = projection(USER_FIELDS)
+    users = await db.users.find({"_id": {"$in": partner_ids}}, projection=fields).to_list(length=None)
+    if len(users) < 100:
+        users += await db.users.find({"_id": {"$nin": partner_ids}}, projection=fields).to_list(length=100 - len(users))
     
     results = []
     for u in users:
@@ -161,12 +384,13 @@ async def list_users(current_user: Annotated[dict, Depends(get_current_user)]):
                     {"sender_id": other_uid, "recipient_id": current_uid}
                 ]
             },
+            projection={"content": 1, "timestamp": 1},
             sort=[("timestamp", pymongo.DESCENDING)]
         )
         
         # 2. Unread Count (messages FROM other TO me)
         status = await db.conversation_status.find_one({"user_id": current_uid, "conversation_id": other_uid})
-        last_read = status["last_read_at"] if status else datetime.min
+        last_read = read_markers.effective_last_read(current_uid, other_uid, status)
         
         unread = await db.messages.count_documents({
             "is_group": False,
@@ -182,22 +406,35 @@ async def list_users(current_user: Annotated[dict, Depends(get_current_user)]):
         
     # Sort by last_message_time desc
     results.sort(key=lambda x: x.get("last_message_time") or datetime.min, reverse=True)
-    return results
+    return fast_json(results, USER_FIELDS, response)
 
 @app.get("/messages/{recipient_id}", response_model=List[MessageModel])
 async def get_personal_messages(
     recipient_id: str, 
-    current_user: Annotated[dict, Depends(get_current_user)]
+    current_user: Annotated[dict, Depends(get_current_user)],
+    request: Request,
+    response: Response,
 ):
     current_user_id = str(current_user["_id"])
-    messages = await db.messages.find({
+    conversation = {
         "is_group": False,
         "$or": [
             {"sender_id": current_user_id, "recipient_id": recipient_id},
             {"sender_id": recipient_id, "recipient_id": current_user_id}
         ]
-    }).sort("timestamp", pymongo.ASCENDING).to_list(length=100)
-    return messages
+    }
+    # Messages are append-only, so the newest one versions the whole history
+    latest = await history_db.messages.find_one(
+        conversation, projection={"timestamp": 1}, sort=[("timestamp", pymongo.DESCENDING)]
+    )
+    cached = not_modified(request, response, make_etag("dm", current_user_id, recipient_id, stamp(latest)))
+    if cached:
+        return cached
+
+    messages = await history_db.messages.find(
+        conversation, projection=projection(MESSAGE_FIELDS)
+    ).sort("timestamp", pymongo.ASCENDING).to_list(length=100)
+    return fast_json(messages, MESSAGE_FIELDS, response)
 
 @app.post("/groups", response_model=GroupModel)
 async def create_group(group: GroupModel, current_user: Annotated[dict, Depends(get_current_user)]):
@@ -213,10 +450,36 @@ async def create_group(group: GroupModel, current_user: Annotated[dict, Depends(
     # Notify members? For now just return
     return await db.groups.find_one({"_id": created_group.inserted_id})
 
+async def groups_version(user_id: str, groups: List[dict]):
+    """Cheap version of the /groups view: group docs already in hand, newest group message, newest read marker."""
+    group_ids = [str(g["_id"]) for g in groups]
+    latest_msg = await db.messages.find_one(
+        {"recipient_id": {"$in": group_ids}, "is_group": True},
+        projection={"timestamp": 1},
+        sort=[("timestamp", pymongo.DESCENDING)]
+    ) if group_ids else None
+    latest_read = await db.conversation_status.find_one(
+        {"user_id": user_id},
+        projection={"last_read_at": 1},
+        sort=[("last_read_at", pymongo.DESCENDING)]
+    )
+    membership = [(g["_id"], g.get("name"), len(g.get("members", []))) for g in groups]
+    return make_etag(
+        "groups", user_id, membership, stamp(latest_msg), stamp(latest_read, "last_read_at"),
+        read_markers.user_latest.get(user_id)
+    )
+
 @app.get("/groups", response_model=List[GroupModel])
-async def list_groups(current_user: Annotated[dict, Depends(get_current_user)]):
+async def list_groups(
+    current_user: Annotated[dict, Depends(get_current_user)],
+    request: Request,
+    response: Response,
+):
     user_id = str(current_user["_id"])
-    groups = await db.groups.find({"members": user_id}).to_list(1000)
+    groups = await db.groups.find({"members": user_id}, projection=projection(GROUP_FIELDS)).to_list(1000)
+    cached = not_modified(request, response, await groups_version(user_id, groups))
+    if cached:
+        return cached
     
     results = []
     for g in groups:
@@ -225,12 +488,13 @@ async def list_groups(current_user: Annotated[dict, Depends(get_current_user)]):
         # 1. Last Message
         last_msg = await db.messages.find_one(
             {"recipient_id": group_id, "is_group": True},
+            projection={"content": 1, "timestamp": 1},
             sort=[("timestamp", pymongo.DESCENDING)]
         )
         
         # 2. Unread Count
         status = await db.conversation_status.find_one({"user_id": user_id, "conversation_id": group_id})
-        last_read = status["last_read_at"] if status else datetime.min
+        last_read = read_markers.effective_last_read(user_id, group_id, status)
         
         unread = await db.messages.count_documents({
             "recipient_id": group_id,
@@ -246,7 +510,7 @@ async def list_groups(current_user: Annotated[dict, Depends(get_current_user)]):
         
     # Sort by last_message_time desc
     results.sort(key=lambda x: x.get("last_message_time") or datetime.min, reverse=True)
-    return results
+    return fast_json(results, GROUP_FIELDS, response)
 
 @app.put("/groups/{group_id}/members", response_model=GroupModel)
 async def add_group_members(group_id: str, request: AddMembersRequest, current_user: Annotated[dict, Depends(get_current_user)]):
@@ -288,43 +552,110 @@ async def delete_group(group_id: str, current_user: Annotated[dict, Depends(get_
     await db.groups.delete_one({"_id": ObjectId(group_id)})
     return {"detail": "Group deleted"}
 
+# Conversations a user was recently validated against, so repeated read marks skip the lookups
+CONVERSATION_CACHE_SECONDS = float(os.getenv("CONVERSATION_CACHE_SECONDS", 60))
+CONVERSATION_CACHE_SIZE = 10000
+# (user_id, conversation_id) -> (expires at, group members or None for a DM)
+conversation_cache: Dict[Tuple[str, str], Tuple[float, Optional[List[str]]]] = {}
+
+async def resolve_conversation(user_id: str, conversation_id: str) -> Optional[List[str]]:
+    """Members of a group the caller belongs to, None for a DM with an existing user; 404 otherwise."""
+    key = (user_id, conversation_id)
+    cached = conversation_cache.get(key)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+
+    if not ObjectId.is_valid(conversation_id):
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    group = await db.groups.find_one(
+        {"_id": ObjectId(conversation_id), "members": user_id}, projection={"members": 1}
+    )
+    if not group and not await db.users.find_one({"_id": ObjectId(conversation_id)}, projection={"_id": 1}):
+        raise HTTPException(status_code=404, detail="Conversation not found")
+
+    members = group["members"] if group else None
+    if len(conversation_cache) >= CONVERSATION_CACHE_SIZE:
+        conversation_cache.clear()
+    conversation_cache[key] = (time.monotonic() + CONVERSATION_CACHE_SECONDS, members)
+    return members
+
 @app.post("/conversations/read/{conversation_id}")
 async def mark_conversation_read(
         conversation_id: str, 
         current_user: Annotated[dict, Depends(get_current_user)]
     ):
     user_id = str(current_user["_id"])
-    now = datetime.utcnow()
-    
-    # Upsert status
-    await db.conversation_status.update_one(
-        {"user_id": user_id, "conversation_id": conversation_id},
-        {"$set": {"last_read_at": now, "type": "unknown"}}, # Type is less critical here
-        upsert=True
-    )
+    members = await resolve_conversation(user_id, conversation_id)
+
+    # Buffered; written to conversation_status in the next bulk flush, which also sends
+    # one read receipt per coalesced marker
+    read_markers.mark(user_id, conversation_id, datetime.utcnow(), "group" if members is not None else "dm", members)
     return {"status": "ok"}
 
 @app.get("/messages/group/{group_id}", response_model=List[MessageModel])
 async def get_group_messages(
     group_id: str,
-    current_user: Annotated[dict, Depends(get_current_user)]
+    current_user: Annotated[dict, Depends(get_current_user)],
+    request: Request,
+    response: Response,
 ):
     # Verify membership (Optional but recommended)
     group = await db.groups.find_one({"_id": ObjectId(group_id), "members": str(current_user["_id"])})
     if not group:
          raise HTTPException(status_code=403, detail="Not a member of this group")
 
-    messages = await db.messages.find({
+    latest = await history_db.messages.find_one(
+        {"is_group": True, "recipient_id": group_id},
+        projection={"timestamp": 1},
+        sort=[("timestamp", pymongo.DESCENDING)]
+    )
+    cached = not_modified(request, response, make_etag("group", group_id, stamp(latest)))
+    if cached:
+        return cached
+
+    messages = await history_db.messages.find({
         "is_group": True,
         "recipient_id": group_id
-    }).sort("timestamp", pymongo.ASCENDING).to_list(length=100)
+    }, projection=projection(MESSAGE_FIELDS)).sort("timestamp", pymongo.ASCENDING).to_list(length=100)
 
     # Store sender names for client convenience?
     # For now, client resolves names from /users list
-    return messages
+    return fast_json(messages, MESSAGE_FIELDS, response)
+
+@app.get("/debug/profile", response_class=PlainTextResponse)
+async def capture_profile(
+    current_user: Annotated[dict, Depends(get_current_user)],
+    seconds: float = Query(5, gt=0, le=60),
+    interval_ms: float = Query(5, ge=1, le=1000),
+    x_profiler_token: Annotated[Optional[str], Header()] = None,
+):
+    """Samples this worker's event loop for `seconds` and returns collapsed stacks for a flamegraph.
+
+    Operators only: needs ENABLE_PROFILER=1 and the PROFILER_TOKEN shared secret.
+    """
+    if not ENABLE_PROFILER:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not profiler_authorized(x_profiler_token):
+        raise HTTPException(status_code=403, detail="Profiler token required")
+    try:
+        return await profile_event_loop(seconds, interval_ms / 1000)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
 
 if __name__ == "__main__":
     import uvicorn
-    import os
     port = int(os.environ.get("PORT", 8003))
-    uvicorn.run("api.main:app", host="0.0.0.0", port=port, reload=True)
+    if os.environ.get("RELOAD", "0") == "1":
+        # Development: single process with auto-reload
+        uvicorn.run("api.main:app", host="0.0.0.0", port=port, reload=True)
+    else:
+        # WebSocket fan-out (ConnectionManager) is per process, so more than one worker
+        # only delivers live messages between users connected to the same worker.
+        uvicorn.run(
+            "api.main:app",
+            host="0.0.0.0",
+            port=port,
+            workers=int(os.environ.get("WEB_CONCURRENCY", 1)),
+            proxy_headers=True,
+            timeout_graceful_shutdown=int(os.environ.get("GRACEFUL_SHUTDOWN_SECONDS", 15)),
+        )
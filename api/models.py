@@ -27,6 +27,10 @@ class UserResponse(BaseModel):
         arbitrary_types_allowed=True,
     )
 
+class DirectoryPage(BaseModel):
+    users: List[UserResponse]
+    next_cursor: Optional[str] = None
+
 class Token(BaseModel):
     access_token: str
     token_type: str
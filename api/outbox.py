@@ -0,0 +1,124 @@
+import os
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, List, Set, Tuple
+import pymongo
+from bson import ObjectId
+from api.database import db
+
+logger = logging.getLogger("chat_app.outbox")
+
+# Undelivered frames kept in memory per user before the queue is spilled to `db.outbox`
+OUTBOX_MEMORY_LIMIT = int(os.getenv("OUTBOX_MEMORY_LIMIT", 100))
+# Spilled entries kept per user; past this the oldest are trimmed and the client is told
+# to reload history instead of replaying the backlog
+OUTBOX_STORED_LIMIT = int(os.getenv("OUTBOX_STORED_LIMIT", 500))
+
+
+def message_payload(message: dict) -> dict:
+    """Rebuilds the live "message" frame for a stored message document."""
+    payload = {
+        "type": "message",
+        "id": str(message["_id"]),
+        "sender_id": message["sender_id"],
+        "content": message["content"],
+        "timestamp": message["timestamp"].isoformat(),
+        "is_group": message.get("is_group", False),
+    }
+    if payload["is_group"]:
+        payload["group_id"] = message["recipient_id"]
+    else:
+        payload["recipient_id"] = message["recipient_id"]
+    return payload
+
+
+class Outbox:
+    """Per-user queue of messages that arrived while the user had no open connection.
+
+    Recent entries stay in memory as ready-to-send frames; once a user's queue exceeds
+    `memory_limit` it is spilled to the indexed `outbox` collection as message references.
+    At most `stored_limit` references are kept per user; trimming leaves a `truncated` marker.
+    """
+
+    def __init__(self, memory_limit: int = OUTBOX_MEMORY_LIMIT, stored_limit: int = OUTBOX_STORED_LIMIT):
+        self.memory_limit = memory_limit
+        self.stored_limit = stored_limit
+        self.queues: Dict[str, Deque[dict]] = {}
+        # Users whose in-memory queue lost entries to a failed spill
+        self.truncated: Set[str] = set()
+
+    async def push(self, user_id: str, payload: dict):
+        queue = self.queues.setdefault(user_id, deque())
+        queue.append(payload)
+        if len(queue) > self.memory_limit:
+            await self.spill(user_id)
+
+    async def spill(self, user_id: str):
+        queue = self.queues.pop(user_id, None)
+        if not queue:
+            return
+        now = datetime.utcnow()
+        refs = [
+            {"user_id": user_id, "message_id": ObjectId(p["id"]), "created_at": now}
+            for p in queue
+        ]
+        try:
+            await db.outbox.insert_many(refs, ordered=True)
+            await self.trim(user_id, now)
+        except Exception as e:
+            logger.error("Failed to spill %d outbox entries for %s: %s", len(refs), user_id, e)
+            # Keep the newest entries in memory rather than losing all of them
+            self.queues[user_id] = deque(list(queue)[-self.memory_limit:])
+            self.truncated.add(user_id)
+
+    async def trim(self, user_id: str, now: datetime):
+        """Drops the user's oldest references beyond `stored_limit` and leaves a `truncated` marker."""
+        # The newest reference past the limit, found on the (user_id, _id) index
+        overflow = await db.outbox.find(
+            {"user_id": user_id}, projection={"_id": 1}
+        ).sort("_id", pymongo.DESCENDING).skip(self.stored_limit).limit(1).to_list(length=1)
+        if not overflow:
+            return
+        await db.outbox.delete_many({"user_id": user_id, "_id": {"$lte": overflow[0]["_id"]}})
+        await db.outbox.insert_one({"user_id": user_id, "truncated": True, "created_at": now})
+
+    async def drain(self, user_id: str) -> Tuple[List[dict], bool]:
+        """Collects everything queued for `user_id` (spilled first, then in memory), oldest first.
+
+        Returns `(frames, truncated)`; when part of the backlog was trimmed no frames are
+        returned and the client is expected to reload its conversations instead.
+        """
+        in_memory = list(self.queues.pop(user_id, ()))
+        truncated = user_id in self.truncated
+        self.truncated.discard(user_id)
+
+        # The stored backlog is capped, so one read covers it; one extra entry shows whether
+        # concurrent spills pushed it past the cap
+        spilled = await db.outbox.aggregate([
+            {"$match": {"user_id": user_id}},
+            {"$sort": {"_id": pymongo.ASCENDING}},
+            {"$limit": self.stored_limit + 1},
+            {"$lookup": {"from": "messages", "localField": "message_id", "foreignField": "_id", "as": "message"}},
+            {"$unwind": {"path": "$message", "preserveNullAndEmptyArrays": True}},
+            {"$project": {"message": 1, "truncated": 1}},
+        ]).to_list(length=None)
+        if len(spilled) > self.stored_limit or any(entry.get("truncated") for entry in spilled):
+            truncated = True
+
+        if truncated:
+            await db.outbox.delete_many({"user_id": user_id})
+            return [], True
+        if spilled:
+            await db.outbox.delete_many({"user_id": user_id, "_id": {"$lte": spilled[-1]["_id"]}})
+
+        # References to messages that no longer exist are dropped along with the rest
+        return [message_payload(entry["message"]) for entry in spilled if entry.get("message")] + in_memory, False
+
+    async def stop(self):
+        """Spills every in-memory queue so nothing is lost across restarts."""
+        for user_id in list(self.queues):
+            await self.spill(user_id)
+
+
+outbox = Outbox()
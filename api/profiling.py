@@ -0,0 +1,175 @@
+import os
+import sys
+import hmac
+import time
+import asyncio
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Optional
+from pymongo import monitoring
+
+logger = logging.getLogger("chat_app.profiling")
+
+# All hooks are opt-in; with the defaults nothing is installed or measured
+PROFILE_REQUESTS = os.getenv("PROFILE_REQUESTS", "0") == "1"
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", 200))
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 50))
+PROFILE_MONGO = os.getenv("PROFILE_MONGO", "0") == "1"
+ENABLE_PROFILER = os.getenv("ENABLE_PROFILER", "0") == "1"
+# Shared secret callers must send as X-Profiler-Token; the profiler stays off without one
+PROFILER_TOKEN = os.getenv("PROFILER_TOKEN", "")
+MAX_PROFILE_SECONDS = 60
+
+
+class TimingMiddleware:
+    """ASGI middleware adding a Server-Timing header and logging slow HTTP requests."""
+
+    def __init__(self, app, slow_ms: float = SLOW_REQUEST_MS):
+        self.app = app
+        self.slow_ms = slow_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                elapsed = (time.perf_counter() - start) * 1000
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", f"app;dur={elapsed:.1f}".encode()))
+                message["headers"] = headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            if elapsed >= self.slow_ms:
+                logger.warning("slow request %s %s took %.1fms", scope["method"], scope["path"], elapsed)
+
+
+@contextmanager
+def ws_timer(kind: str):
+    """Times one WebSocket loop iteration when PROFILE_REQUESTS is on."""
+    if not PROFILE_REQUESTS:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = (time.perf_counter() - start) * 1000
+        if elapsed >= SLOW_REQUEST_MS:
+            logger.warning("slow ws %s frame took %.1fms", kind, elapsed)
+
+
+def profiler_authorized(token: Optional[str]) -> bool:
+    return bool(PROFILER_TOKEN) and token is not None and hmac.compare_digest(token, PROFILER_TOKEN)
+
+
+def query_shape(value):
+    """Replaces literal values in a filter with their type names, keeping operators and field names."""
+    if isinstance(value, dict):
+        return {k: query_shape(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        # $in / $or lists: one representative element is enough for the shape
+        return [query_shape(value[0])] if value else []
+    return type(value).__name__
+
+
+class SlowCommandListener(monitoring.CommandListener):
+    """Logs Mongo commands slower than `slow_ms` together with the shape of their filter."""
+
+    SHAPED_FIELDS = ("filter", "query", "q", "pipeline", "sort", "updates", "deletes")
+
+    def __init__(self, slow_ms: float = SLOW_QUERY_MS):
+        self.slow_ms = slow_ms
+        self._pending: Dict[int, tuple] = {}
+
+    def started(self, event):
+        command = event.command
+        shape = {f: query_shape(command[f]) for f in self.SHAPED_FIELDS if f in command}
+        collection = command.get(event.command_name)
+        self._pending[event.request_id] = (collection, shape)
+
+    def _finished(self, event, outcome: str):
+        collection, shape = self._pending.pop(event.request_id, (None, None))
+        elapsed = event.duration_micros / 1000
+        if elapsed >= self.slow_ms:
+            logger.warning(
+                "slow mongo %s on %s took %.1fms (%s) shape=%s",
+                event.command_name, collection, elapsed, outcome, shape
+            )
+
+    def succeeded(self, event):
+        self._finished(event, "ok")
+
+    def failed(self, event):
+        self._finished(event, "failed")
+
+
+def command_listeners():
+    return [SlowCommandListener()] if PROFILE_MONGO else []
+
+
+class SamplingProfiler:
+    """Samples one thread's Python stack from a background thread and aggregates folded stacks.
+
+    The output is Brendan Gregg's collapsed format (`frame;frame;frame count`), ready for
+    flamegraph.pl / speedscope.
+    """
+
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        if stack:
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+
+_profile_lock = asyncio.Lock()
+
+
+async def profile_event_loop(seconds: float, interval: float = 0.005) -> str:
+    """Profiles the thread running the current event loop for `seconds` without blocking it."""
+    if _profile_lock.locked():
+        raise RuntimeError("A profile is already being captured")
+    async with _profile_lock:
+        profiler = SamplingProfiler(threading.get_ident(), interval)
+        profiler.start()
+        try:
+            await asyncio.sleep(min(seconds, MAX_PROFILE_SECONDS))
+        finally:
+            await asyncio.to_thread(profiler.stop)
+        return profiler.collapsed()
@@ -0,0 +1,131 @@
+import os
+import time
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+# Budgets are "rate per second / burst size", per event kind
+MESSAGE_RATE = float(os.getenv("WS_MESSAGE_RATE", 5))
+MESSAGE_BURST = float(os.getenv("WS_MESSAGE_BURST", 10))
+TYPING_RATE = float(os.getenv("WS_TYPING_RATE", 2))
+TYPING_BURST = float(os.getenv("WS_TYPING_BURST", 4))
+# A user's budget is shared by all of their connections, so it is looser than one connection's
+USER_BUDGET_FACTOR = float(os.getenv("WS_USER_BUDGET_FACTOR", 2))
+MAX_INFLIGHT_SENDS = int(os.getenv("WS_MAX_INFLIGHT_SENDS", 200))
+# How often idle, refilled user buckets are swept out
+PRUNE_INTERVAL_SECONDS = 60
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def peek(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= 1
+
+    def take(self):
+        self.tokens -= 1
+
+    def idle_full(self, now: float) -> bool:
+        """True once the bucket has been idle long enough to refill completely."""
+        return self.tokens + (now - self.updated) * self.rate >= self.burst
+
+    def retry_after(self) -> float:
+        """Seconds until the next token is available."""
+        return max(0.0, (1 - self.tokens) / self.rate) if self.rate else float("inf")
+
+
+class RateLimiter:
+    """Token buckets per (user, kind) and per (connection, kind), plus a global cap on in-flight sends."""
+
+    def __init__(self):
+        self.budgets: Dict[str, Tuple[float, float]] = {
+            "message": (MESSAGE_RATE, MESSAGE_BURST),
+            "typing": (TYPING_RATE, TYPING_BURST),
+        }
+        self.user_buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self.connection_buckets: Dict[Tuple[int, str], TokenBucket] = {}
+        self.inflight = 0
+        self.max_inflight = MAX_INFLIGHT_SENDS
+        # (kind, reason) -> number of rejected events
+        self.throttled: Counter = Counter()
+        self.last_prune = time.monotonic()
+
+    def _bucket(self, buckets: dict, key, kind: str, factor: float = 1) -> TokenBucket:
+        bucket = buckets.get(key)
+        if bucket is None:
+            rate, burst = self.budgets[kind]
+            bucket = buckets[key] = TokenBucket(rate * factor, burst * factor)
+        return bucket
+
+    def check(self, user_id: str, connection, kind: str) -> Optional[dict]:
+        """Consumes one token for `kind`; returns a reject frame if either budget is exhausted."""
+        if kind not in self.budgets:
+            return None
+        now = time.monotonic()
+        if now - self.last_prune >= PRUNE_INTERVAL_SECONDS:
+            self.prune(now)
+        user_bucket = self._bucket(self.user_buckets, (user_id, kind), kind, USER_BUDGET_FACTOR)
+        conn_bucket = self._bucket(self.connection_buckets, (id(connection), kind), kind)
+
+        # Only spend tokens when both budgets allow it, so a rejected event costs nothing
+        for scope, bucket in (("connection", conn_bucket), ("user", user_bucket)):
+            if not bucket.peek(now):
+                return self.reject(kind, "rate_limited", scope=scope, retry_after=bucket.retry_after())
+        conn_bucket.take()
+        user_bucket.take()
+        return None
+
+    def reject(self, kind: str, code: str, **details) -> dict:
+        self.throttled[(kind, code)] += 1
+        frame = {"type": "error", "code": code, "kind": kind}
+        if "retry_after" in details:
+            details["retry_after"] = round(details["retry_after"], 3)
+        frame.update(details)
+        return frame
+
+    def try_admit(self, kind: str) -> Optional[dict]:
+        """Admission control for a send; the caller must `release()` after an admitted send."""
+        if self.inflight >= self.max_inflight:
+            return self.reject(kind, "overloaded", retry_after=1.0)
+        self.inflight += 1
+        return None
+
+    def release(self):
+        self.inflight -= 1
+
+    def forget_connection(self, connection):
+        for kind in self.budgets:
+            self.connection_buckets.pop((id(connection), kind), None)
+
+    def forget_user(self, user_id: str):
+        # Only refilled buckets are dropped: reconnecting must not reset a drained budget
+        now = time.monotonic()
+        for kind in self.budgets:
+            bucket = self.user_buckets.get((user_id, kind))
+            if bucket is not None and bucket.idle_full(now):
+                del self.user_buckets[(user_id, kind)]
+
+    def prune(self, now: float):
+        """Drops user buckets that have refilled; a fresh bucket would behave identically."""
+        self.last_prune = now
+        for key in [key for key, bucket in self.user_buckets.items() if bucket.idle_full(now)]:
+            del self.user_buckets[key]
+
+    def stats(self) -> dict:
+        return {
+            "inflight": self.inflight,
+            "user_buckets": len(self.user_buckets),
+            "connection_buckets": len(self.connection_buckets),
+            "throttled": {f"{kind}:{code}": count for (kind, code), count in self.throttled.items()},
+        }
+
+
+limiter = RateLimiter()
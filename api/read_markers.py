@@ -0,0 +1,106 @@
+import os
+import asyncio
+import logging
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from pymongo import UpdateOne
+from api.database import db
+
+logger = logging.getLogger("chat_app.read_markers")
+
+READ_MARKER_FLUSH_SECONDS = float(os.getenv("READ_MARKER_FLUSH_SECONDS", 2))
+
+
+class ReadMarkerBuffer:
+    """Coalesces read markers in memory (latest timestamp per user/conversation) and
+    writes them to `conversation_status` in periodic bulk batches.
+
+    After a batch is written, `on_flush(user_id, conversation_id, last_read_at, members)` is
+    awaited once per coalesced marker, so read receipts go out per flush rather than per click.
+    """
+
+    def __init__(self, flush_interval: float = READ_MARKER_FLUSH_SECONDS):
+        self.flush_interval = flush_interval
+        # (user_id, conversation_id) -> (last_read_at, type, group members or None for a DM)
+        self.pending: Dict[Tuple[str, str], Tuple[datetime, str, Optional[List[str]]]] = {}
+        # Batch currently being written; still visible to readers until the write lands
+        self.flushing: Dict[Tuple[str, str], Tuple[datetime, str, Optional[List[str]]]] = {}
+        # user_id -> newest pending marker, used to version the user's conversation lists
+        self.user_latest: Dict[str, datetime] = {}
+        self.on_flush: Optional[Callable[[str, str, datetime, Optional[List[str]]], Awaitable]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def mark(self, user_id: str, conversation_id: str, at: datetime, type: str, members: List[str] = None):
+        key = (user_id, conversation_id)
+        current = self.pending.get(key)
+        if current is None or at >= current[0]:
+            self.pending[key] = (at, type, members)
+        if at > self.user_latest.get(user_id, datetime.min):
+            self.user_latest[user_id] = at
+
+    def last_read(self, user_id: str, conversation_id: str) -> Optional[datetime]:
+        entry = self.pending.get((user_id, conversation_id)) or self.flushing.get((user_id, conversation_id))
+        return entry[0] if entry else None
+
+    def effective_last_read(self, user_id: str, conversation_id: str, status: Optional[dict]) -> datetime:
+        """Merges a stored `conversation_status` document with any marker not yet flushed."""
+        stored = status["last_read_at"] if status else datetime.min
+        pending = self.last_read(user_id, conversation_id)
+        return max(stored, pending) if pending else stored
+
+    async def flush(self):
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, {}
+        self.flushing = batch
+        ops = [
+            UpdateOne(
+                {"user_id": user_id, "conversation_id": conversation_id},
+                # $max keeps markers monotonic if workers flush out of order
+                {"$max": {"last_read_at": at}, "$set": {"type": type}},
+                upsert=True
+            )
+            for (user_id, conversation_id), (at, type, _) in batch.items()
+        ]
+        try:
+            await db.conversation_status.bulk_write(ops, ordered=False)
+        except Exception as e:
+            logger.error("Failed to flush %d read markers: %s", len(ops), e)
+            # Put the batch back so the next flush retries it; newer markers win
+            for (user_id, conversation_id), (at, type, members) in batch.items():
+                self.mark(user_id, conversation_id, at, type, members)
+            return
+        finally:
+            self.flushing = {}
+        # Stored markers now cover these users, unless a newer one arrived mid-flush
+        for (user_id, _), (at, _, _) in batch.items():
+            if self.user_latest.get(user_id) == at:
+                del self.user_latest[user_id]
+        if self.on_flush is not None:
+            for (user_id, conversation_id), (at, _, members) in batch.items():
+                try:
+                    await self.on_flush(user_id, conversation_id, at, members)
+                except Exception as e:
+                    logger.error("Read marker hook failed for %s/%s: %s", user_id, conversation_id, e)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+read_markers = ReadMarkerBuffer()
@@ -0,0 +1,54 @@
+import orjson
+from typing import Iterable, List, Optional
+from bson import ObjectId
+from fastapi import Response
+
+# Output shape of the response models, field -> default. Keys follow the models' aliases
+# (`_id`), which is what FastAPI emits for them.
+USER_FIELDS = {
+    "_id": None, "email": None, "name": None, "last_seen": None,
+    "last_message": None, "last_message_time": None, "unread_count": 0,
+}
+GROUP_FIELDS = {
+    "_id": None, "name": None, "members": [], "created_by": None,
+    "last_message": None, "last_message_time": None, "unread_count": 0,
+}
+MESSAGE_FIELDS = {
+    "_id": None, "sender_id": None, "recipient_id": None, "content": None,
+    "timestamp": None, "is_group": False,
+}
+
+
+def projection(fields: dict) -> dict:
+    """Mongo projection for the stored subset of `fields`."""
+    return {name: 1 for name in fields}
+
+
+def _default(obj):
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def shape(docs: Iterable[dict], fields: dict) -> List[dict]:
+    """Trims raw Mongo documents to the response fields, filling defaults, in one pass."""
+    return [{name: doc.get(name, default) for name, default in fields.items()} for doc in docs]
+
+
+class FastJSONResponse(Response):
+    """JSON response for trusted, already-shaped Mongo documents; skips response_model validation.
+
+    orjson encodes naive datetimes as ISO-8601 without offset and ObjectIds via `_default`,
+    matching what the Pydantic models produce.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=_default)
+
+
+def fast_json(docs: Iterable[dict], fields: dict, response: Optional[Response] = None) -> FastJSONResponse:
+    # Headers set on the injected response (e.g. ETag) are not applied to returned responses
+    headers = dict(response.headers) if response is not None else None
+    return FastJSONResponse(shape(docs, fields), headers=headers)
@@ -1,15 +1,91 @@
 from fastapi import WebSocket
-from typing import Dict, List
+from typing import Dict, List, Set
+import os
 import json
+import asyncio
+import orjson
 from api.database import db
 from api.models import MessageModel
+from api.outbox import outbox
 from datetime import datetime
 
+# Coalescing window for connections that opted into batching; 0 means "end of the current loop tick"
+BATCH_WINDOW_MS = float(os.getenv("WS_BATCH_WINDOW_MS", 5))
+# Frames a batching connection may queue behind a slow send before it is closed (1013)
+BATCH_MAX_FRAMES = int(os.getenv("WS_BATCH_MAX_FRAMES", 1000))
+
 class ConnectionManager:
     def __init__(self):
         # user_id -> List of WebSockets (user might be connected from multiple devices)
         self.active_connections: Dict[str, List[WebSocket]] = {}
         # group_id -> List of user_ids (This could be cached, but fetching from DB is safer for now)
+        # Set on shutdown; new connections are turned away while existing ones are closed
+        self.draining = False
+        # websocket -> frames waiting to go out as one array frame (batching connections only)
+        self.outbound: Dict[WebSocket, List[dict]] = {}
+        # Connections with a batch send in flight; at most one per connection
+        self.sending: Set[WebSocket] = set()
+        # Connections closed for falling too far behind; further frames are dropped
+        self.overflowed: Set[WebSocket] = set()
+        # Strong references to in-flight flush tasks; the event loop only holds them weakly
+        self.flush_tasks: Set[asyncio.Task] = set()
+
+    def enable_batching(self, websocket: WebSocket):
+        self.outbound[websocket] = []
+
+    async def send(self, websocket: WebSocket, payload: dict):
+        """Sends one frame, or queues it for the connection's next batch if it opted in."""
+        if websocket in self.overflowed:
+            return
+        buffer = self.outbound.get(websocket)
+        if buffer is None:
+            await websocket.send_json(payload)
+            return
+        buffer.append(payload)
+        if len(buffer) > BATCH_MAX_FRAMES:
+            self._close_overflowed(websocket, len(buffer))
+            return
+        # While a send is in flight the buffer just grows; that flush picks it up when done
+        if len(buffer) == 1 and websocket not in self.sending:
+            loop = asyncio.get_running_loop()
+            if BATCH_WINDOW_MS > 0:
+                loop.call_later(BATCH_WINDOW_MS / 1000, self._schedule_flush, websocket)
+            else:
+                loop.call_soon(self._schedule_flush, websocket)
+
+    def _schedule_flush(self, websocket: WebSocket):
+        self._track(self.flush(websocket))
+
+    def _track(self, coro):
+        task = asyncio.create_task(coro)
+        self.flush_tasks.add(task)
+        task.add_done_callback(self.flush_tasks.discard)
+
+    def _close_overflowed(self, websocket: WebSocket, queued: int):
+        print(f"Closing slow connection with {queued} frames queued")
+        self.overflowed.add(websocket)
+        self.outbound[websocket] = []
+        self._track(websocket.close(code=1013))
+
+    async def flush(self, websocket: WebSocket):
+        """Sends queued frames as array frames, one send at a time; frames queued during a
+        send go out in the next one."""
+        if websocket in self.sending:
+            return
+        self.sending.add(websocket)
+        try:
+            while True:
+                frames = self.outbound.get(websocket)
+                if not frames:
+                    return
+                self.outbound[websocket] = []
+                try:
+                    await websocket.send_text(orjson.dumps(frames).decode())
+                except Exception as e:
+                    print(f"Error sending batch of {len(frames)} frames: {e}")
+                    return
+        finally:
+            self.sending.discard(websocket)
 
     async def connect(self, websocket: WebSocket, user_id: str):
         await websocket.accept()
@@ -19,7 +95,7 @@ class ConnectionManager:
         
         # 1. Send current online users
         online_users = list(self.active_connections.keys())
-        await websocket.send_json({
+        await self.send(websocket, {
             "type": "online_users",
             "users": online_users
         })
@@ -27,10 +103,20 @@ class ConnectionManager:
         # 2. Notify others
         await self.notify_online_status(user_id, "online")
 
+        # 3. Everything that arrived while the user was offline, in one frame; a backlog too
+        # large to replay is replaced by a marker telling the client to reload instead
+        pending, truncated = await outbox.drain(user_id)
+        if truncated:
+            await self.send(websocket, {"type": "outbox_truncated"})
+        elif pending:
+            await self.send(websocket, {"type": "outbox", "messages": pending})
+
     async def disconnect(self, websocket: WebSocket, user_id: str):
         if user_id in self.active_connections:
             if websocket in self.active_connections[user_id]:
                 self.active_connections[user_id].remove(websocket)
+            self.outbound.pop(websocket, None)
+            self.overflowed.discard(websocket)
             if not self.active_connections[user_id]:
                 del self.active_connections[user_id]
                 
@@ -44,6 +130,18 @@ class ConnectionManager:
                 
                 await self.notify_online_status(user_id, "offline", last_seen=now)
 
+    async def drain(self, code: int = 1012):
+        """Asks every client to reconnect elsewhere and closes its socket (1012 = service restart)."""
+        self.draining = True
+        for user_id, connections in list(self.active_connections.items()):
+            for connection in list(connections):
+                try:
+                    await self.flush(connection)
+                    await connection.send_json({"type": "server_shutdown", "reconnect": True})
+                    await connection.close(code=code)
+                except Exception:
+                    pass
+
     async def notify_online_status(self, user_id: str, status: str, last_seen: datetime = None):
         payload = {
             "type": "status",
@@ -56,7 +154,7 @@ class ConnectionManager:
         for uid, connections in self.active_connections.items():
             for connection in connections:
                 try:
-                    await connection.send_json(payload)
+                    await self.send(connection, payload)
                 except:
                     pass
 
@@ -71,7 +169,7 @@ class ConnectionManager:
                     if member_id == sender_id: continue
                     if member_id in self.active_connections:
                         for connection in self.active_connections[member_id]:
-                            await connection.send_json({
+                            await self.send(connection, {
                                 "type": "typing",
                                 "sender_id": sender_id,
                                 "group_id": recipient_id,
@@ -81,12 +179,29 @@ class ConnectionManager:
             # Direct Message
             if recipient_id in self.active_connections:
                 for connection in self.active_connections[recipient_id]:
-                    await connection.send_json({
+                    await self.send(connection, {
                         "type": "typing",
                         "sender_id": sender_id,
                         "is_group": False
                     })
 
+    async def send_read_receipt(self, reader_id: str, conversation_id: str, read_at: datetime, members: List[str] = None):
+        """Pushes a read receipt to the other participants; `members` is given for groups."""
+        if members is not None:
+            recipients = [m for m in members if m != reader_id]
+            payload = {"type": "read_receipt", "reader_id": reader_id, "group_id": conversation_id, "is_group": True}
+        else:
+            recipients = [conversation_id]
+            payload = {"type": "read_receipt", "reader_id": reader_id, "is_group": False}
+        payload["last_read_at"] = read_at.isoformat()
+
+        for member_id in recipients:
+            for connection in self.active_connections.get(member_id, []):
+                try:
+                    await self.send(connection, payload)
+                except Exception as e:
+                    print(f"Error sending read receipt to {member_id}: {e}")
+
     async def send_personal_message(self, message: str, sender_id: str, recipient_id: str):
         # 1. Save to DB
         msg_model = MessageModel(
@@ -95,10 +210,11 @@ class ConnectionManager:
             content=message,
             is_group=False
         )
-        await db.messages.insert_one(msg_model.model_dump(exclude={"id"}))
+        result = await db.messages.insert_one(msg_model.model_dump(exclude={"id"}))
         
         payload = {
             "type": "message",
+            "id": str(result.inserted_id),
             "sender_id": sender_id,
             "recipient_id": recipient_id, # Include recipient_id for sender to know where it went
             "content": message,
@@ -106,19 +222,21 @@ class ConnectionManager:
             "is_group": False
         }
 
-        # 2. Send to Recipient (if online)
+        # 2. Send to Recipient (if online), otherwise queue it for their next connection
         if recipient_id in self.active_connections:
             for connection in self.active_connections[recipient_id]:
                 try:
-                    await connection.send_json(payload)
+                    await self.send(connection, payload)
                 except Exception as e:
                     print(f"Error sending to recipient {recipient_id}: {e}")
+        elif recipient_id != sender_id:
+            await outbox.push(recipient_id, payload)
 
         # 3. Echo to Sender (for multiple devices or just confirmation)
         if sender_id in self.active_connections:
             for connection in self.active_connections[sender_id]:
                 try:
-                    await connection.send_json(payload)
+                    await self.send(connection, payload)
                 except Exception as e:
                     print(f"Error sending to sender {sender_id}: {e}")
 
@@ -130,10 +248,11 @@ class ConnectionManager:
             content=message,
             is_group=True
         )
-        await db.messages.insert_one(msg_model.model_dump(exclude={"id"}))
+        result = await db.messages.insert_one(msg_model.model_dump(exclude={"id"}))
 
         payload = {
             "type": "message",
+            "id": str(result.inserted_id),
             "sender_id": sender_id,
             "group_id": group_id,
             "content": message,
@@ -151,8 +270,10 @@ class ConnectionManager:
                 if member_id in self.active_connections:
                     for connection in self.active_connections[member_id]:
                         try:
-                            await connection.send_json(payload)
+                            await self.send(connection, payload)
                         except Exception as e:
                             print(f"Error sending group message to {member_id}: {e}")
+                elif member_id != sender_id:
+                    await outbox.push(member_id, payload)
 
 manager = ConnectionManager()
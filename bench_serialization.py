@@ -0,0 +1,88 @@
+"""Per-item CPU cost of serializing hot list endpoints: response_model validation vs the fast path.
+
+    python bench_serialization.py [items] [rounds]
+"""
+import sys
+import json
+import time
+from datetime import datetime, timedelta
+from typing import List
+from bson import ObjectId
+from pydantic import TypeAdapter
+from fastapi.encoders import jsonable_encoder
+
+from api.models import UserResponse, GroupModel, MessageModel
+from api.serialization import FastJSONResponse, shape, USER_FIELDS, GROUP_FIELDS, MESSAGE_FIELDS
+
+
+def make_users(n):
+    now = datetime.utcnow()
+    return [{
+        "_id": ObjectId(), "name": f"User {i}", "email": f"user{i}@example.com", "password": "hashed",
+        "status": "active", "last_seen": now - timedelta(minutes=i), "last_message": f"message {i}",
+        "last_message_time": now - timedelta(seconds=i), "unread_count": i % 7,
+    } for i in range(n)]
+
+
+def make_groups(n):
+    now = datetime.utcnow()
+    return [{
+        "_id": ObjectId(), "name": f"Group {i}", "members": [str(ObjectId()) for _ in range(8)],
+        "created_by": str(ObjectId()), "last_message": f"message {i}",
+        "last_message_time": now - timedelta(seconds=i), "unread_count": i % 5,
+    } for i in range(n)]
+
+
+def make_messages(n):
+    now = datetime.utcnow()
+    a, b = str(ObjectId()), str(ObjectId())
+    return [{
+        "_id": ObjectId(), "sender_id": a if i % 2 else b, "recipient_id": b if i % 2 else a,
+        "content": f"message body number {i}", "timestamp": now + timedelta(seconds=i), "is_group": False,
+    } for i in range(n)]
+
+
+def pydantic_path(model):
+    adapter = TypeAdapter(List[model])
+
+    def run(docs):
+        # What FastAPI does for response_model: validate, dump to JSON-able python, encode
+        validated = adapter.validate_python(docs)
+        payload = jsonable_encoder(adapter.dump_python(validated, mode="json", by_alias=True))
+        return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
+    return run
+
+
+def fast_path(fields):
+    def run(docs):
+        return FastJSONResponse(shape(docs, fields)).body
+    return run
+
+
+def measure(fn, docs, rounds):
+    fn(docs)  # warm up
+    start = time.process_time()
+    for _ in range(rounds):
+        fn(docs)
+    return (time.process_time() - start) / (rounds * len(docs)) * 1e6
+
+
+def main():
+    items = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    cases = [
+        ("users", make_users(items), UserResponse, USER_FIELDS),
+        ("groups", make_groups(items), GroupModel, GROUP_FIELDS),
+        ("messages", make_messages(items), MessageModel, MESSAGE_FIELDS),
+    ]
+    print(f"{items} items x {rounds} rounds, CPU us/item")
+    print(f"{'endpoint':<10} {'pydantic':>10} {'fast':>10} {'speedup':>8}")
+    for name, docs, model, fields in cases:
+        slow = measure(pydantic_path(model), docs, rounds)
+        fast = measure(fast_path(fields), docs, rounds)
+        print(f"{name:<10} {slow:>10.2f} {fast:>10.2f} {slow / fast:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,29 @@ import { SettingsModal } from './modals/SettingsModal';
 import { CreateGroupModal } from './modals/CreateGroupModal';
 import { GroupDetailsModal } from './modals/GroupDetailsModal';
 
+// Slack for clock skew between the browser and the server when comparing against `last_seen`
+const SIDEBAR_CLOCK_SKEW_MS = 60_000;
+// Upper bound on trusting a saved sidebar at all, e.g. if another device stayed connected
+const SIDEBAR_MAX_AGE_MS = 12 * 60 * 60 * 1000;
+
+const sidebarKey = (userId: string) => `chat_sidebar_${userId}`;
+
+// The saved sidebar is only trusted if the account wasn't online elsewhere after it was saved:
+// `last_seen` is when the account's last connection closed (naive UTC from the API)
+const loadSidebar = (userId: string, lastSeen?: string): { users: User[]; groups: Group[] } | null => {
+    try {
+        const saved = JSON.parse(localStorage.getItem(sidebarKey(userId)) || "null");
+        if (!saved || Date.now() - saved.savedAt > SIDEBAR_MAX_AGE_MS) return null;
+        if (lastSeen) {
+            const seenAt = new Date(/(Z|[+-]\d\d:\d\d)$/.test(lastSeen) ? lastSeen : lastSeen + "Z").getTime();
+            if (seenAt > saved.savedAt + SIDEBAR_CLOCK_SKEW_MS) return null;
+        }
+        return saved;
+    } catch {
+        return null;
+    }
+};
+
 export const ChatDashboard: React.FC = () => {
     const { user: currentUser, token } = useAuth();
 
@@ -36,6 +59,9 @@ export const ChatDashboard: React.FC = () => {
     });
 
     const wsRef = useRef<WebSocket | null>(null);
+    // Latest lists for handlers created once in connectWS
+    const sidebarRef = useRef<{ users: User[]; groups: Group[] }>({ users: [], groups: [] });
+    const [sidebarLoaded, setSidebarLoaded] = useState(false);
 
     // Initial Fetch
     const fetchData = async () => {
@@ -43,15 +69,35 @@ export const ChatDashboard: React.FC = () => {
             const [u, g] = await Promise.all([api.getUsers(), api.getGroups()]);
             setUsers(u);
             setGroups(g);
+            setSidebarLoaded(true);
         } catch (e) {
             console.error(e);
         }
     };
 
+    // Start from the sidebar saved by the last session; the outbox frame on connect brings it
+    // up to date, so /users and /groups are only recomputed when there is nothing usable
     useEffect(() => {
-        fetchData();
+        const saved = currentUser && loadSidebar(currentUser._id, currentUser.last_seen);
+        if (saved) {
+            setUsers(saved.users);
+            setGroups(saved.groups);
+            setSidebarLoaded(true);
+        } else {
+            fetchData();
+        }
     }, []);
 
+    useEffect(() => {
+        sidebarRef.current = { users, groups };
+        if (!currentUser || !sidebarLoaded) return;
+        const save = () => localStorage.setItem(sidebarKey(currentUser._id), JSON.stringify({ users, groups, savedAt: Date.now() }));
+        save();
+        // Re-stamp when the page goes away: the lists are current up to the moment it stops listening
+        window.addEventListener('pagehide', save);
+        return () => window.removeEventListener('pagehide', save);
+    }, [users, groups, sidebarLoaded]);
+
     // WebSocket Logic
     const connectWS = useCallback(() => {
         if (wsRef.current) return;
@@ -61,13 +107,17 @@ export const ChatDashboard: React.FC = () => {
 
         // Ensure we handle trailing slash if present in env
         const wsBase = baseUrl.endsWith('/') ? baseUrl.slice(0, -1) : baseUrl;
-        const wsUrl = `${wsBase}/ws?token=${token}`;
+        // batch=1: server may coalesce frames into a single JSON array
+        const wsUrl = `${wsBase}/ws?token=${token}&batch=1`;
 
         const ws = new WebSocket(wsUrl);
         wsRef.current = ws;
 
         ws.onopen = () => console.log("Connected to WS");
-        ws.onmessage = (event) => handleWSMessage(JSON.parse(event.data));
+        ws.onmessage = (event) => {
+            const data = JSON.parse(event.data);
+            for (const frame of Array.isArray(data) ? data : [data]) handleWSMessage(frame);
+        };
         ws.onclose = () => {
             console.log("WS Disconnected");
             wsRef.current = null;
@@ -137,6 +187,20 @@ export const ChatDashboard: React.FC = () => {
                 }, 3000);
             }
 
+        } else if (data.type === "outbox") {
+            // Messages received while offline: applied locally, no per-message refetch or sound
+            const { users: knownUsers, groups: knownGroups } = sidebarRef.current;
+            const known = new Set([...knownUsers, ...knownGroups].map(c => c._id));
+            for (const msg of data.messages) handleNewMessage(msg, false);
+            // A conversation the saved sidebar doesn't list yet (new group, new contact) needs the full lists
+            const unknown = data.messages.some((msg: Message) => !known.has(
+                msg.is_group ? msg.group_id ?? "" : (msg.sender_id === currentUser?._id ? msg.recipient_id : msg.sender_id)
+            ));
+            if (unknown) fetchData();
+        } else if (data.type === "outbox_truncated") {
+            // Too much arrived while offline to replay; reload the lists and the open chat instead
+            fetchData();
+            if (selectedId) handleSelectChat(selectedId, isGroup);
         } else if (data.type === "message" || !data.type) {
             handleNewMessage(data);
             // Clear typing instantly if message received
@@ -151,7 +215,28 @@ export const ChatDashboard: React.FC = () => {
         }
     };
 
-    const handleNewMessage = (msg: Message) => {
+    // Bumps the conversation's last message / unread count in place. Skips anything not newer than
+    // what the list already shows, so messages already counted by /users or /groups aren't counted twice.
+    const applyToSidebar = (msg: Message, isCurrent: boolean) => {
+        const incoming = msg.sender_id !== currentUser?._id;
+        const bump = <T extends User | Group>(item: T): T => {
+            if (item.last_message_time && new Date(item.last_message_time) >= new Date(msg.timestamp)) return item;
+            return {
+                ...item,
+                last_message: msg.content,
+                last_message_time: msg.timestamp,
+                unread_count: (item.unread_count || 0) + (incoming && !isCurrent ? 1 : 0)
+            };
+        };
+        if (msg.is_group) {
+            setGroups(prev => prev.map(g => g._id === msg.group_id ? bump(g) : g));
+        } else {
+            const otherId = incoming ? msg.sender_id : msg.recipient_id;
+            setUsers(prev => prev.map(u => u._id === otherId ? bump(u) : u));
+        }
+    };
+
+    const handleNewMessage = (msg: Message, live: boolean = true) => {
         console.log("📨 New message received:", msg);
         console.log("Current state:", { selectedId, isGroup, currentUserId: currentUser?._id });
 
@@ -198,7 +283,7 @@ export const ChatDashboard: React.FC = () => {
                 }
                 return [...prev, msg];
             });
-        } else {
+        } else if (live) {
             console.log("Message not for current chat, showing notification");
             // Notification logic here
             if (settings.sound) {
@@ -211,6 +296,10 @@ export const ChatDashboard: React.FC = () => {
         }
 
         // 2. Update Sidebar (List reordering & unread)
+        if (!live) {
+            applyToSidebar(msg, isCurrent);
+            return;
+        }
         // Re-fetch or update local state. For simplicity, we can refetch lightly or update state manually.
         // Let's refetch to be safe and consistent
         fetchData();
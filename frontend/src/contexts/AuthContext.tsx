@@ -45,6 +45,8 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
     };
 
     const logout = () => {
+        // Sidebar saved by ChatDashboard for this account
+        if (user) localStorage.removeItem(`chat_sidebar_${user._id}`);
         setToken(null);
         setUser(null);
         localStorage.removeItem('access_token');
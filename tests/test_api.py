@@ -1,6 +1,7 @@
+import asyncio
 from fastapi.testclient import TestClient
 from unittest.mock import MagicMock, AsyncMock, patch
-from api.main import app
+from api.main import app, get_current_user, manager
 from bson import ObjectId
 
 client = TestClient(app)
@@ -69,3 +70,143 @@ def test_websocket_endpoint():
                     mock_connect.assert_called_with(websocket, mock_user_id)
                     # We won't test full message loop here as it's infinite, 
                     # but connection success is verified.
+
+def test_get_user_not_modified():
+    with patch("api.main.db") as mock_db:
+        mock_db.users.find_one = AsyncMock(return_value=mock_user_data)
+
+        response = client.get(f"/users/{mock_user_id}")
+        etag = response.headers["etag"]
+
+        response = client.get(f"/users/{mock_user_id}", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+
+def test_group_messages_not_modified():
+    group_id = str(ObjectId())
+    app.dependency_overrides[get_current_user] = lambda: mock_user_data
+    try:
+        with patch("api.main.db") as mock_db, patch("api.main.history_db") as mock_history_db:
+            mock_db.groups.find_one = AsyncMock(return_value={"_id": ObjectId(group_id), "members": [mock_user_id]})
+            mock_history_db.messages.find_one = AsyncMock(return_value={"_id": ObjectId(), "timestamp": "2024-01-01T00:00:00"})
+            mock_history_db.messages.find.return_value.sort.return_value.to_list = AsyncMock(return_value=[])
+
+            response = client.get(f"/messages/group/{group_id}")
+            assert response.status_code == 200
+            etag = response.headers["etag"]
+
+            response = client.get(f"/messages/group/{group_id}", headers={"If-None-Match": etag})
+            assert response.status_code == 304
+            # The history query only ran for the first (uncached) request
+            mock_history_db.messages.find.assert_called_once()
+    finally:
+        app.dependency_overrides.clear()
+
+def test_user_directory_prefix_search_and_cursor():
+    app.dependency_overrides[get_current_user] = lambda: mock_user_data
+    page = [
+        {"_id": ObjectId(), "name": f"Alice {i}", "email": f"alice{i}@example.com", "name_lower": f"alice {i}"}
+        for i in range(3)
+    ]
+    try:
+        with patch("api.main.db") as mock_db:
+            find = mock_db.users.find
+            find.return_value.sort.return_value.limit.return_value.to_list = AsyncMock(return_value=page)
+
+            response = client.get("/users/directory", params={"q": "AL", "scope": "all", "limit": 2})
+            assert response.status_code == 200
+            body = response.json()
+            assert [u["name"] for u in body["users"]] == ["Alice 0", "Alice 1"]
+            assert body["next_cursor"]
+
+            query = find.call_args.args[0]
+            assert {"$or": [{"name_lower": {"$regex": "^al"}}, {"email_lower": {"$regex": "^al"}}]} in query["$and"]
+
+            response = client.get("/users/directory", params={"scope": "all", "cursor": body["next_cursor"]})
+            assert response.status_code == 200
+            keyset = find.call_args.args[0]["$and"][-1]
+            assert keyset["$or"][0] == {"name_lower": {"$gt": "alice 1"}}
+    finally:
+        app.dependency_overrides.clear()
+
+def test_ready_follows_lifespan():
+    assert client.get("/ready").status_code == 503
+
+    try:
+        with patch("api.main.warm_up", new_callable=AsyncMock) as mock_warm_up, \
+             patch("api.main.ping", new_callable=AsyncMock, return_value=True):
+            with TestClient(app) as live_client:
+                mock_warm_up.assert_awaited_once()
+                assert live_client.get("/ready").status_code == 200
+
+        # Shutdown drained the manager and failed readiness
+        assert manager.draining
+        assert client.get("/ready").status_code == 503
+    finally:
+        manager.draining = False
+
+def test_metrics_exposes_throttle_counters():
+    with patch("api.main.limiter.throttled", {("typing", "rate_limited"): 3}):
+        response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.json()["ws"]["throttled"] == {"typing:rate_limited": 3}
+
+def test_profile_requires_shared_secret():
+    app.dependency_overrides[get_current_user] = lambda: mock_user_data
+    try:
+        with patch("api.main.ENABLE_PROFILER", True), patch("api.profiling.PROFILER_TOKEN", "s3cret"), \
+             patch("api.main.profile_event_loop", new_callable=AsyncMock, return_value="main 1"):
+            assert client.get("/debug/profile", params={"seconds": 1}).status_code == 403
+            assert client.get("/debug/profile", params={"seconds": 1},
+                              headers={"X-Profiler-Token": "wrong"}).status_code == 403
+
+            response = client.get("/debug/profile", params={"seconds": 1}, headers={"X-Profiler-Token": "s3cret"})
+            assert response.status_code == 200
+            assert response.text == "main 1"
+    finally:
+        app.dependency_overrides.clear()
+
+def test_mark_read_rejects_unknown_conversation():
+    app.dependency_overrides[get_current_user] = lambda: mock_user_data
+    try:
+        with patch("api.main.db") as mock_db, patch("api.main.read_markers") as mock_markers, \
+             patch("api.main.manager.send_read_receipt", new_callable=AsyncMock) as mock_receipt, \
+             patch.dict("api.main.conversation_cache", clear=True):
+            # Not a member of the group and not a user id
+            mock_db.groups.find_one = AsyncMock(return_value=None)
+            mock_db.users.find_one = AsyncMock(return_value=None)
+
+            assert client.post(f"/conversations/read/{ObjectId()}").status_code == 404
+            assert client.post("/conversations/read/not-an-id").status_code == 404
+            mock_markers.mark.assert_not_called()
+
+            other = ObjectId()
+            mock_db.users.find_one = AsyncMock(return_value={"_id": other})
+            assert client.post(f"/conversations/read/{other}").status_code == 200
+            assert mock_markers.mark.call_args.args[3] == "dm"
+
+            # Repeated marks are served from the cache; receipts wait for the buffer flush
+            assert client.post(f"/conversations/read/{other}").status_code == 200
+            mock_db.users.find_one.assert_awaited_once()
+            mock_receipt.assert_not_called()
+    finally:
+        app.dependency_overrides.clear()
+
+def test_users_version_scopes_last_seen_to_partners():
+    from api.main import users_version
+    partner_ids = [ObjectId(), ObjectId()]
+    with patch("api.main.db") as mock_db:
+        mock_db.messages.find_one = AsyncMock(return_value=None)
+        mock_db.conversation_status.find_one = AsyncMock(return_value=None)
+        mock_db.users.find_one = AsyncMock(return_value=None)
+        mock_db.users.estimated_document_count = AsyncMock(return_value=5)
+
+        asyncio.run(users_version(mock_user_id, partner_ids))
+        seen_filter = mock_db.users.find_one.await_args_list[0].args[0]
+        assert seen_filter == {"_id": {"$in": partner_ids}}
+
+        # Without partners only the fill-up marker is read; nobody's last_seen is involved
+        mock_db.users.find_one.reset_mock()
+        asyncio.run(users_version(mock_user_id, []))
+        assert mock_db.users.find_one.await_count == 1
+        assert mock_db.users.find_one.await_args.args[0] == {}
@@ -0,0 +1,73 @@
+import pytest
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+from bson import ObjectId
+from api.outbox import Outbox
+
+def frame(i):
+    return {"type": "message", "id": str(ObjectId()), "sender_id": "a", "recipient_id": "u1",
+            "content": f"m{i}", "timestamp": datetime(2024, 1, 1).isoformat(), "is_group": False}
+
+@pytest.mark.asyncio
+async def test_queue_spills_to_collection_when_full():
+    box = Outbox(memory_limit=2)
+    with patch("api.outbox.db") as mock_db:
+        mock_db.outbox.insert_many = AsyncMock()
+        mock_db.outbox.find.return_value.sort.return_value.skip.return_value.limit.return_value.to_list = AsyncMock(return_value=[])
+        for i in range(3):
+            await box.push("u1", frame(i))
+
+        refs = mock_db.outbox.insert_many.call_args.args[0]
+        assert [r["user_id"] for r in refs] == ["u1"] * 3
+        assert "u1" not in box.queues
+
+@pytest.mark.asyncio
+async def test_drain_returns_spilled_then_memory_in_one_read():
+    box = Outbox()
+    await box.push("u1", frame(1))
+    stored = {"_id": ObjectId(), "sender_id": "a", "recipient_id": "g1", "content": "old",
+              "timestamp": datetime(2023, 12, 31), "is_group": True}
+    spilled = [{"_id": ObjectId(), "message": stored}]
+
+    with patch("api.outbox.db") as mock_db:
+        mock_db.outbox.aggregate = MagicMock()
+        mock_db.outbox.aggregate.return_value.to_list = AsyncMock(return_value=spilled)
+        mock_db.outbox.delete_many = AsyncMock()
+
+        frames, truncated = await box.drain("u1")
+
+        assert not truncated
+        assert [f["content"] for f in frames] == ["old", "m1"]
+        assert frames[0]["group_id"] == "g1"
+        mock_db.outbox.aggregate.assert_called_once()
+        mock_db.outbox.delete_many.assert_awaited_once()
+    assert "u1" not in box.queues
+
+@pytest.mark.asyncio
+async def test_spill_trims_oldest_refs_and_drain_reports_truncation():
+    box = Outbox(memory_limit=1, stored_limit=2)
+    cutoff = ObjectId()
+    with patch("api.outbox.db") as mock_db:
+        mock_db.outbox.insert_many = AsyncMock()
+        mock_db.outbox.insert_one = AsyncMock()
+        mock_db.outbox.delete_many = AsyncMock()
+        find = mock_db.outbox.find.return_value.sort.return_value
+        find.skip.return_value.limit.return_value.to_list = AsyncMock(return_value=[{"_id": cutoff}])
+        for i in range(2):
+            await box.push("u1", frame(i))
+
+        find.skip.assert_called_with(2)
+        mock_db.outbox.delete_many.assert_awaited_with({"user_id": "u1", "_id": {"$lte": cutoff}})
+        marker = mock_db.outbox.insert_one.call_args.args[0]
+        assert marker["truncated"] is True
+
+        await box.push("u1", frame(9))
+        mock_db.outbox.aggregate = MagicMock()
+        mock_db.outbox.aggregate.return_value.to_list = AsyncMock(return_value=[{"_id": ObjectId(), **marker}])
+        mock_db.outbox.delete_many.reset_mock()
+
+        frames, truncated = await box.drain("u1")
+
+        assert truncated and frames == []
+        mock_db.outbox.delete_many.assert_awaited_once_with({"user_id": "u1"})
+    assert "u1" not in box.queues
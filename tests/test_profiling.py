@@ -0,0 +1,30 @@
+import asyncio
+import pytest
+from api.profiling import query_shape, profile_event_loop
+
+def test_query_shape_hides_values():
+    shape = query_shape({
+        "is_group": False,
+        "$or": [{"sender_id": "a", "recipient_id": "b"}, {"sender_id": "b", "recipient_id": "a"}],
+        "timestamp": {"$gt": 1.5},
+    })
+    assert shape == {
+        "is_group": "bool",
+        "$or": [{"sender_id": "str", "recipient_id": "str"}],
+        "timestamp": {"$gt": "float"},
+    }
+
+@pytest.mark.asyncio
+async def test_profile_event_loop_collects_folded_stacks():
+    async def busy():
+        end = asyncio.get_running_loop().time() + 0.2
+        while asyncio.get_running_loop().time() < end:
+            sum(range(1000))
+            await asyncio.sleep(0)
+
+    profile, _ = await asyncio.gather(profile_event_loop(0.2, 0.002), busy())
+    lines = profile.splitlines()
+    assert lines
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) > 0
+    assert ";" in stack
@@ -0,0 +1,51 @@
+from unittest.mock import patch
+from api.ratelimit import RateLimiter
+
+def test_connection_budget_rejects_burst():
+    limiter = RateLimiter()
+    conn = object()
+    with patch("api.ratelimit.time.monotonic", return_value=100.0):
+        results = [limiter.check("u1", conn, "typing") for _ in range(5)]
+
+    assert results[:4] == [None] * 4
+    assert results[4]["code"] == "rate_limited"
+    assert results[4]["scope"] == "connection"
+    assert limiter.stats()["throttled"] == {"typing:rate_limited": 1}
+
+def test_user_budget_shared_across_connections():
+    limiter = RateLimiter()
+    connections = [object(), object(), object()]
+    with patch("api.ratelimit.time.monotonic", return_value=100.0):
+        # Each connection gets 10 messages, the user 20 in total
+        for conn in connections[:2]:
+            for _ in range(10):
+                assert limiter.check("u1", conn, "message") is None
+        rejected = limiter.check("u1", connections[2], "message")
+        # Typing has its own budget
+        typing = limiter.check("u1", connections[2], "typing")
+
+    assert rejected["scope"] == "user"
+    assert typing is None
+
+def test_inflight_cap():
+    limiter = RateLimiter()
+    limiter.max_inflight = 1
+    assert limiter.try_admit("message") is None
+    assert limiter.try_admit("message")["code"] == "overloaded"
+    limiter.release()
+    assert limiter.try_admit("message") is None
+
+def test_idle_user_buckets_are_pruned():
+    limiter = RateLimiter()
+    limiter.last_prune = 100.0
+    conn = object()
+    with patch("api.ratelimit.time.monotonic", return_value=100.0):
+        for _ in range(3):
+            limiter.check("u1", conn, "message")
+    assert ("u1", "message") in limiter.user_buckets
+
+    # Long enough for the drained bucket to refill, and past the prune interval
+    with patch("api.ratelimit.time.monotonic", return_value=1000.0):
+        limiter.check("u2", object(), "typing")
+    assert ("u1", "message") not in limiter.user_buckets
+    assert ("u2", "typing") in limiter.user_buckets
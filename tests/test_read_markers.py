@@ -0,0 +1,52 @@
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, patch
+from api.read_markers import ReadMarkerBuffer
+
+@pytest.mark.asyncio
+async def test_markers_coalesce_into_one_bulk_write():
+    buffer = ReadMarkerBuffer()
+    t0 = datetime(2024, 1, 1)
+    for i in range(5):
+        buffer.mark("u1", "c1", t0 + timedelta(seconds=i), "dm")
+    buffer.mark("u1", "c2", t0, "group")
+
+    assert buffer.last_read("u1", "c1") == t0 + timedelta(seconds=4)
+    assert buffer.effective_last_read("u1", "c1", {"last_read_at": t0}) == t0 + timedelta(seconds=4)
+
+    with patch("api.read_markers.db") as mock_db:
+        mock_db.conversation_status.bulk_write = AsyncMock()
+        await buffer.flush()
+
+        ops = mock_db.conversation_status.bulk_write.call_args.args[0]
+        assert len(ops) == 2
+        assert buffer.pending == {}
+        assert buffer.user_latest == {}
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_markers():
+    buffer = ReadMarkerBuffer()
+    buffer.mark("u1", "c1", datetime(2024, 1, 1), "dm")
+
+    with patch("api.read_markers.db") as mock_db:
+        mock_db.conversation_status.bulk_write = AsyncMock(side_effect=Exception("down"))
+        await buffer.flush()
+
+    assert buffer.last_read("u1", "c1") == datetime(2024, 1, 1)
+
+@pytest.mark.asyncio
+async def test_flush_sends_one_receipt_per_coalesced_marker():
+    buffer = ReadMarkerBuffer()
+    buffer.on_flush = AsyncMock()
+    t0 = datetime(2024, 1, 1)
+    for i in range(5):
+        buffer.mark("u1", "g1", t0 + timedelta(seconds=i), "group", ["u1", "u2"])
+    buffer.mark("u1", "u3", t0, "dm")
+
+    with patch("api.read_markers.db") as mock_db:
+        mock_db.conversation_status.bulk_write = AsyncMock()
+        await buffer.flush()
+
+    assert buffer.on_flush.await_count == 2
+    buffer.on_flush.assert_any_await("u1", "g1", t0 + timedelta(seconds=4), ["u1", "u2"])
+    buffer.on_flush.assert_any_await("u1", "u3", t0, None)
@@ -0,0 +1,28 @@
+import json
+from datetime import datetime
+from typing import List
+from bson import ObjectId
+from pydantic import TypeAdapter
+from api.models import UserResponse, GroupModel, MessageModel
+from api.serialization import FastJSONResponse, shape, USER_FIELDS, GROUP_FIELDS, MESSAGE_FIELDS
+
+def pydantic_json(model, docs):
+    adapter = TypeAdapter(List[model])
+    return json.loads(adapter.dump_json(adapter.validate_python(docs), by_alias=True))
+
+def fast_json(docs, fields):
+    return json.loads(FastJSONResponse(shape(docs, fields)).body)
+
+def test_fast_path_matches_response_models():
+    ts = datetime(2024, 5, 1, 12, 30, 15, 123000)
+    user = {"_id": ObjectId(), "name": "Alice", "email": "alice@example.com", "password": "x",
+            "last_seen": ts, "last_message": "hi", "last_message_time": ts, "unread_count": 2}
+    bare_user = {"_id": ObjectId(), "name": "Bob", "email": "bob@example.com"}
+    group = {"_id": ObjectId(), "name": "G", "members": ["a", "b"], "created_by": "a",
+             "last_message": None, "last_message_time": None, "unread_count": 0}
+    message = {"_id": ObjectId(), "sender_id": "a", "recipient_id": "b", "content": "hey",
+               "timestamp": ts, "is_group": False}
+
+    assert fast_json([user, bare_user], USER_FIELDS) == pydantic_json(UserResponse, [user, bare_user])
+    assert fast_json([group], GROUP_FIELDS) == pydantic_json(GroupModel, [group])
+    assert fast_json([message], MESSAGE_FIELDS) == pydantic_json(MessageModel, [message])
@@ -0,0 +1,103 @@
+import json
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from api.sockets import ConnectionManager
+
+def fake_websocket():
+    websocket = MagicMock()
+    websocket.send_json = AsyncMock()
+    websocket.send_text = AsyncMock()
+    return websocket
+
+@pytest.mark.asyncio
+async def test_batching_connection_gets_one_array_frame():
+    manager = ConnectionManager()
+    websocket = fake_websocket()
+    manager.enable_batching(websocket)
+
+    for i in range(3):
+        await manager.send(websocket, {"type": "typing", "n": i})
+    websocket.send_text.assert_not_called()
+
+    await asyncio.sleep(0.05)
+    websocket.send_text.assert_awaited_once()
+    assert not manager.flush_tasks
+    frames = json.loads(websocket.send_text.call_args.args[0])
+    assert [f["n"] for f in frames] == [0, 1, 2]
+    websocket.send_json.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_plain_connection_sends_immediately():
+    manager = ConnectionManager()
+    websocket = fake_websocket()
+
+    await manager.send(websocket, {"type": "typing"})
+    websocket.send_json.assert_awaited_once_with({"type": "typing"})
+
+@pytest.mark.asyncio
+async def test_sigterm_drains_before_server_shutdown():
+    import signal
+    from unittest.mock import patch
+    from api import main
+
+    order = []
+    websocket = fake_websocket()
+    websocket.send_json = AsyncMock(side_effect=lambda payload: order.append(payload["type"]))
+    websocket.close = AsyncMock(side_effect=lambda code: order.append(f"close:{code}"))
+
+    # Stands in for uvicorn's own exit handler, which starts closing connections
+    server_handler = lambda sig, frame: order.append("server_shutdown_started")
+    original = signal.signal(signal.SIGTERM, server_handler)
+    previous = {}
+    try:
+        with patch.object(main, "manager", ConnectionManager()) as manager, \
+             patch.object(main, "DRAIN_GRACE_SECONDS", 0):
+            manager.active_connections["u1"] = [websocket]
+            previous = main.install_drain_handlers()
+
+            signal.raise_signal(signal.SIGTERM)
+            await asyncio.sleep(0.05)
+
+            assert manager.draining
+            assert order == ["server_shutdown", "close:1012", "server_shutdown_started"]
+    finally:
+        for sig, handler in previous.items():
+            signal.signal(sig, handler)
+        signal.signal(signal.SIGTERM, original)
+
+@pytest.mark.asyncio
+async def test_one_flush_in_flight_and_overflow_closes():
+    from unittest.mock import patch
+    manager = ConnectionManager()
+    websocket = fake_websocket()
+    websocket.close = AsyncMock()
+    release = asyncio.Event()
+    batches = []
+
+    async def slow_send(text):
+        batches.append(json.loads(text))
+        await release.wait()
+    websocket.send_text = AsyncMock(side_effect=slow_send)
+    manager.enable_batching(websocket)
+
+    with patch("api.sockets.BATCH_MAX_FRAMES", 5):
+        await manager.send(websocket, {"n": 0})
+        await asyncio.sleep(0.05)
+        # First batch is stuck in flight; later frames queue instead of starting another send
+        for i in range(1, 4):
+            await manager.send(websocket, {"n": i})
+        await asyncio.sleep(0.05)
+        assert len(batches) == 1
+
+        release.set()
+        await asyncio.sleep(0.05)
+        assert [[f["n"] for f in batch] for batch in batches] == [[0], [1, 2, 3]]
+
+        release.clear()
+        for i in range(7):
+            await manager.send(websocket, {"n": i})
+        await asyncio.sleep(0.05)
+        websocket.close.assert_awaited_once_with(code=1013)
+        assert websocket in manager.overflowed
+        release.set()